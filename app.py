@@ -6,6 +6,7 @@ import hashlib
 import logging
 import sys
 from retailcrm_service import create_order_in_crm
+from tenants import DEFAULT_TENANT, TenantRegistry, load_tenants_config
 
 # Настройка логирования
 # Создаем директорию для логов, если она не существует
@@ -42,10 +43,8 @@ logger = logging.getLogger(__name__)
 # Загрузка переменных окружения
 load_dotenv()
 
-# Конфигурация
-TAPLINK_WEBHOOK_SECRET = os.getenv('TAPLINK_WEBHOOK_SECRET')
-RETAILCRM_API_KEY = os.getenv('RETAILCRM_API_KEY')
-RETAILCRM_URL = os.getenv('RETAILCRM_URL')
+# Реестр арендаторов: клиенты создаются при первом вебхуке и выгружаются при простое
+tenant_registry = TenantRegistry(load_tenants_config())
 
 app = Flask(__name__)
 
@@ -57,9 +56,10 @@ def index():
     return jsonify({'status': 'ok', 'message': 'Taplink to RetailCRM connector is running'})
 
 @app.route('/webhook/taplink', methods=['POST'])
-def process_taplink_webhook():
+@app.route('/webhook/taplink/<tenant_id>', methods=['POST'])
+def process_taplink_webhook(tenant_id=DEFAULT_TENANT):
     """
-    Обрабатывает вебхуки от Taplink
+    Обрабатывает вебхуки от Taplink для указанного арендатора
     """
     try:
         # Получаем тело запроса как строку
@@ -71,21 +71,34 @@ def process_taplink_webhook():
         if not signature:
             logger.warning("No signature received in webhook request")
             return jsonify({'error': 'No signature provided'}), 401
+
+        # Неизвестному арендатору отвечаем так же, как на неверную подпись,
+        # чтобы по ответам нельзя было перебрать существующие идентификаторы
+        secret = tenant_registry.secret(tenant_id)
+        if secret is None:
+            logger.debug(f"Webhook received for unknown tenant: {tenant_id}")
+            return jsonify({'error': 'Invalid signature'}), 401
             
-        # Проверяем подпись
+        # Проверяем подпись до создания контекста арендатора
         expected_signature = hmac.new(
-            TAPLINK_WEBHOOK_SECRET.encode('utf-8'),
+            secret.encode('utf-8'),
             data,
             hashlib.sha1
         ).hexdigest()
         
-        if signature != expected_signature:
-            logger.warning(f"Invalid webhook signature received: {signature}")
+        if not hmac.compare_digest(signature.encode('utf-8'), expected_signature.encode('utf-8')):
+            logger.warning(f"Invalid webhook signature received for tenant {tenant_id}: {signature}")
             return jsonify({'error': 'Invalid signature'}), 401
 
+        if not tenant_registry.allow_request(tenant_id):
+            logger.warning(f"Rate limit exceeded for tenant {tenant_id}")
+            return jsonify({'error': 'Rate limit exceeded'}), 429
+
+        tenant = tenant_registry.get(tenant_id)
+
         # Парсим JSON данные
         webhook_data = request.get_json()
-        logger.info(f"Received webhook from Taplink: {webhook_data}")
+        logger.info(f"Received webhook from Taplink for tenant {tenant_id}: {webhook_data}")
         
         # Проверяем тип события
         action = webhook_data.get('action')
@@ -93,7 +106,7 @@ def process_taplink_webhook():
             # Обработка нового лида
             lead_data = webhook_data.get('data', {})
             # Создаем заказ в RetailCRM
-            result = create_order_in_crm(lead_data)
+            result = create_order_in_crm(tenant, lead_data)
             return jsonify(result)
         else:
             return jsonify({
@@ -102,7 +115,7 @@ def process_taplink_webhook():
             }), 400
             
     except Exception as e:
-        logger.error(f"Error processing webhook: {str(e)}")
+        logger.error(f"Error processing webhook for tenant {tenant_id}: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
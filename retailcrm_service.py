@@ -1,8 +1,5 @@
-import os
-from dotenv import load_dotenv
 import logging
 import json
-import retailcrm
 import time
 from datetime import datetime
 import requests
@@ -10,25 +7,13 @@ import requests
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
-# Загрузка переменных окружения
-load_dotenv()
 
-# Конфигурация
-RETAILCRM_API_KEY = os.getenv('RETAILCRM_API_KEY')
-RETAILCRM_URL = os.getenv('RETAILCRM_URL')
-
-# Инициализация клиента RetailCRM v5
-crm = retailcrm.v5(RETAILCRM_URL, RETAILCRM_API_KEY)
-
-
-
-
-def get_customer_by_phone(phone):
+def get_customer_by_phone(tenant, phone):
     """
     Получает данные клиента из RetailCRM по номеру телефона
     """
     try:
-        response = crm.customers(filters={'phone': phone})
+        response = tenant.crm_client().customers(filters={'phone': phone})
         response_data = response.get_response()
         if response_data.get('success'):
             customers = response_data.get('customers', [])
@@ -38,7 +23,7 @@ def get_customer_by_phone(phone):
         logger.error(f"Error getting customer from RetailCRM: {str(e)}")
         return None
 
-def create_customer_in_crm(customer_data):
+def create_customer_in_crm(tenant, customer_data):
     """
     Создает нового клиента в RetailCRM
     """
@@ -72,7 +57,7 @@ def create_customer_in_crm(customer_data):
             }
         }
         
-        response = crm.customer_create(customer)
+        response = tenant.crm_client().customer_create(customer)
         response_data = response.get_response()
         if response_data.get('success'):
             logger.info(f"Customer created in RetailCRM: {response_data}")
@@ -160,11 +145,12 @@ def get_customer_changes(current_data: dict, new_data: dict) -> dict:
     
     return changes
 
-def create_or_update_customer_in_crm(customer_data: dict) -> dict:
+def create_or_update_customer_in_crm(tenant, customer_data: dict) -> dict:
     """
     Обновляет данные клиента в RetailCRM
     
     Args:
+        tenant (TenantContext): Контекст арендатора
         customer_data (dict): Данные клиента для обновления
         
     Returns:
@@ -176,12 +162,12 @@ def create_or_update_customer_in_crm(customer_data: dict) -> dict:
         return None
         
     # Получаем текущие данные клиента и создаем нового, если клиента не существует
-    customer_data_crm = get_customer_by_phone(phone)
+    customer_data_crm = get_customer_by_phone(tenant, phone)
     if not customer_data_crm:
-        response = create_customer_in_crm(customer_data)
+        response = create_customer_in_crm(tenant, customer_data)
         if response and response.get('success'):
             # Получаем обновленные данные клиента
-            customer_data_crm = get_customer_by_phone(phone)
+            customer_data_crm = get_customer_by_phone(tenant, phone)
             if not customer_data_crm:
                 logger.error("Failed to get created customer data")
                 return None
@@ -208,7 +194,7 @@ def create_or_update_customer_in_crm(customer_data: dict) -> dict:
         
         try:
             # Отправляем обновление в RetailCRM
-            response = crm.customer_edit(customer_data_crm, uid_type='id')
+            response = tenant.crm_client().customer_edit(customer_data_crm, uid_type='id')
             if response.get_response().get('success'):
                 logger.info(f"Successfully updated customer {customer_data_crm['id']} in RetailCRM")
                 return customer_data_crm
@@ -224,17 +210,25 @@ def create_or_update_customer_in_crm(customer_data: dict) -> dict:
 
 
 
-def get_offer(session, item):
+def get_offer(tenant, item):
     """
     Получает данные о торговом предложении из RetailCRM по его имени или по externalId и номиналу
+    Найденные предложения кэшируются в пространстве имен арендатора
     """
     
     try:
+        if item.get('nominal'):
+            cache_key = f"offer:externalId:1-{item.get('nominal')}"
+        else:
+            cache_key = f"offer:name:{item.get('title')}"
+        if (offer := tenant.cache_get(cache_key)) is not None:
+            return offer
+
         if item.get('nominal'):
             external_id = f"1-{item.get('nominal')}"
-            response = session.get(f"{RETAILCRM_URL}/api/v5/store/offers?filter[externalIds][]={external_id}")
+            response = tenant.session.get(f"{tenant.url}/api/v5/store/offers?filter[externalIds][]={external_id}")
         else:
-            response = session.get(f"{RETAILCRM_URL}/api/v5/store/offers?filter[name]={item.get('title')}")
+            response = tenant.session.get(f"{tenant.url}/api/v5/store/offers?filter[name]={item.get('title')}")
             
         response_data = response.json()
         if not response_data.get('success'):
@@ -247,6 +241,7 @@ def get_offer(session, item):
                 f"{'externalId=1-' + item.get('nominal') if item.get('nominal') else 'name=' + item.get('title')}"
             )
             
+        tenant.cache_set(cache_key, offers[0])
         return offers[0]
         
     except requests.RequestException as e:
@@ -256,7 +251,7 @@ def get_offer(session, item):
     
     
 
-def prepare_order_data(customer_data_crm, items, total_sum, manager_comment, extra_data, delivery_date):
+def prepare_order_data(tenant, customer_data_crm, items, total_sum, manager_comment, extra_data, delivery_date):
     """
     Подготавливает данные для создания заказа
     Собирает все данные в финальную структуру заказа
@@ -286,11 +281,11 @@ def prepare_order_data(customer_data_crm, items, total_sum, manager_comment, ext
         'status': 'new',
         'customer': {
             'id': customer_data_crm['id'],
-            'site': 'taplink2'
+            'site': tenant.site
         },
         'contact': {
             'id': customer_data_crm['id'],
-            'site': 'taplink2'
+            'site': tenant.site
         },
         'delivery': {
             'code': 'courier',
@@ -329,21 +324,18 @@ def prepare_order_data(customer_data_crm, items, total_sum, manager_comment, ext
     return order_data
 
 
-def prepare_order_items(items):
+def prepare_order_items(tenant, items):
     """
     Подготавливает товары для заказа
     """
     try:
         available_items = []
         total_sum = 0
-        session = requests.Session()
-        session.headers['X-API-KEY'] = RETAILCRM_API_KEY
-        session.headers['Content-Type'] = 'application/x-www-form-urlencoded'
     
         manager_comment = ""
         for item in items:
             try:
-                offer = get_offer(session, item)
+                offer = get_offer(tenant, item)
             except IndexError as e:
                 manager_comment += f"{str(e)}\n"
                 continue
@@ -374,7 +366,7 @@ def prepare_order_items(items):
     return available_items, total_sum, manager_comment
 
 
-def process_order_data(order_data: dict) -> dict:
+def process_order_data(tenant, order_data: dict) -> dict:
     """
     Преобразует данные заказа из формата Taplink в формат для RetailCRM
     """
@@ -389,34 +381,8 @@ def process_order_data(order_data: dict) -> dict:
             title = record.get('title', '')
             value = record.get('value', '')
             
-            if title == 'Имя':  # Имя
-                customer_data['firstName'] = value
-            elif title == 'Фамилия':
-                customer_data['lastName'] = value
-            elif title == 'Телефон':  # Телефон
-                customer_data['phone'] = value
-            elif title == 'Время доставки / примечание / промокод':
-                customer_data['extra_data'] = value
-            elif title == 'Дата доставки':  # Дата доставки
-                customer_data['delivery_date'] = value
-            elif title == 'Способ оплаты':  # Способ оплаты
-                customer_data['payment_type'] = value
-            elif title == 'Город':
-                customer_data['city'] = value
-            elif title == 'Улица':
-                customer_data['street'] = value
-            elif title == 'Дом':
-                customer_data['building'] = value
-            elif title == 'Кв./офис':
-                customer_data['flat'] = value
-            elif title == 'Этаж':
-                customer_data['floor'] = value
-            elif title == 'Подъезд':
-                customer_data['block'] = value
-            elif title == 'Корпус':
-                customer_data['housing'] = value
-            elif title == 'Строение':
-                customer_data['house'] = value
+            if field := tenant.field_mapping.get(title):
+                customer_data[field] = value
         
         # Формируем полный адрес
         address_parts = []
@@ -466,11 +432,12 @@ def process_order_data(order_data: dict) -> dict:
         raise
 
 
-def create_order_in_crm(order_data):
+def create_order_in_crm(tenant, order_data):
     """
     Обрабатывает заказ и создает его в RetailCRM
     
     Args:
+        tenant (TenantContext): Контекст арендатора
         order_data (dict): Данные заказа
         
     Returns:
@@ -478,7 +445,7 @@ def create_order_in_crm(order_data):
     """
     try:
         # Преобразуем данные заказа
-        order_data = process_order_data(order_data)
+        order_data = process_order_data(tenant, order_data)
         if not order_data:
             return {
                 'success': False,
@@ -486,7 +453,7 @@ def create_order_in_crm(order_data):
                 'items': []
             }
         # Обновляем или создаем клиента
-        customer_data_crm = create_or_update_customer_in_crm(order_data['customer'])
+        customer_data_crm = create_or_update_customer_in_crm(tenant, order_data['customer'])
         if not customer_data_crm:
             logger.error("Failed to create/update customer")
             return {
@@ -496,7 +463,7 @@ def create_order_in_crm(order_data):
             }
         
         # Подготавливаем товары
-        available_items, total_sum, manager_comment = prepare_order_items(order_data['items'])
+        available_items, total_sum, manager_comment = prepare_order_items(tenant, order_data['items'])
         if not available_items:
             logger.error("No valid items after preparation")
             return {
@@ -516,13 +483,13 @@ def create_order_in_crm(order_data):
             }
         
         # Подготавливаем данные заказа
-        prepared_order_data = prepare_order_data(customer_data_crm, available_items, total_sum, manager_comment, order_data['customer'].get('extra_data', ''),
+        prepared_order_data = prepare_order_data(tenant, customer_data_crm, available_items, total_sum, manager_comment, order_data['customer'].get('extra_data', ''),
                                                   order_data['customer'].get('delivery_date', ''))
         # Логируем данные заказа для отладки
         logger.info(f"Prepared order data: {json.dumps(prepared_order_data, indent=2)}")
         
         # Создаем заказ в RetailCRM
-        response = crm.order_create(prepared_order_data, site='taplink2')
+        response = tenant.crm_client().order_create(prepared_order_data, site=tenant.site)
         result = response.get_response()
         
         if result.get('success'):
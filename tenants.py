@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+import retailcrm
+from retailcrm.response import Response
+from retailcrm.versions.base import query_builder
+import requests
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Конфигурация
+TENANTS_CONFIG_FILE = os.getenv('TENANTS_CONFIG_FILE')
+TENANT_IDLE_TTL = int(os.getenv('TENANT_IDLE_TTL', 600))  # Секунды простоя до выгрузки клиента
+TENANT_MAX_CLIENTS = int(os.getenv('TENANT_MAX_CLIENTS', 100))  # Максимум одновременно загруженных клиентов
+# Время жизни кэша торговых предложений; 0 отключает кэш.
+# Кэшированное предложение содержит цены, поэтому при TTL > 0 изменение цены
+# в RetailCRM попадает в заказы с задержкой до TTL секунд
+TENANT_CACHE_TTL = int(os.getenv('TENANT_CACHE_TTL', 0))
+TENANT_CACHE_MAX_ENTRIES = int(os.getenv('TENANT_CACHE_MAX_ENTRIES', 1000))  # Максимум записей в кэше арендатора
+TENANT_RATE_LIMIT = int(os.getenv('TENANT_RATE_LIMIT', 60))  # Запросов в минуту на одного арендатора
+
+# Источник времени для TTL и окон ограничения частоты; подменяется в тестах
+_clock = time.monotonic
+
+DEFAULT_TENANT = 'default'
+DEFAULT_SITE = 'taplink2'
+
+# Соответствие заголовков полей формы Taplink полям клиента
+DEFAULT_FIELD_MAPPING = {
+    'Имя': 'firstName',
+    'Фамилия': 'lastName',
+    'Телефон': 'phone',
+    'Время доставки / примечание / промокод': 'extra_data',
+    'Дата доставки': 'delivery_date',
+    'Способ оплаты': 'payment_type',
+    'Город': 'city',
+    'Улица': 'street',
+    'Дом': 'building',
+    'Кв./офис': 'flat',
+    'Этаж': 'floor',
+    'Подъезд': 'block',
+    'Корпус': 'housing',
+    'Строение': 'house',
+}
+
+
+class SessionClient(retailcrm.v5):
+    """
+    Клиент RetailCRM v5, отправляющий запросы через пул соединений арендатора
+    вместо модульных requests.get/requests.post библиотеки
+
+    Клиент хранит параметры запроса в self.parameters, поэтому он не
+    потокобезопасен: на каждый запрос создается отдельный экземпляр
+    через TenantContext.crm_client()
+    """
+
+    def __init__(self, crm_url, api_key, session):
+        super().__init__(crm_url, api_key)
+        self.session = session
+
+    # get/post повторяют Base.get/Base.post из retailcrm 5.1.2, заменяя
+    # requests.get/requests.post на вызовы через self.session
+    def get(self, url, version=True):
+        base_url = self.api_url + '/' + self.api_version if version else self.api_url
+        requests_url = base_url + url if not self.parameters else base_url + url + "?" + query_builder(self.parameters)
+        response = self.session.get(requests_url)
+        self.parameters = {}
+
+        return Response(response.status_code, response.json())
+
+    def post(self, url, version=True):
+        base_url = self.api_url + '/' + self.api_version if version else self.api_url
+        response = self.session.post(base_url + url, data=self.parameters)
+        self.parameters = {}
+
+        return Response(response.status_code, response.json())
+
+
+class TenantContext:
+    """
+    Состояние одного арендатора: пул соединений, фабрика клиентов RetailCRM
+    и кэш торговых предложений
+    """
+
+    def __init__(self, tenant_id: str, config: dict):
+        self.tenant_id = tenant_id
+        self.webhook_secret = config['webhook_secret']
+        self.url = config['retailcrm_url']
+        self.api_key = config['retailcrm_api_key']
+        self.site = config.get('site', DEFAULT_SITE)
+        self.field_mapping = {**DEFAULT_FIELD_MAPPING, **config.get('field_mapping', {})}
+        self.cache_ttl = config.get('cache_ttl', TENANT_CACHE_TTL)
+        self.cache_max_entries = config.get('cache_max_entries', TENANT_CACHE_MAX_ENTRIES)
+
+        # Собственный пул соединений для всех запросов арендатора к API
+        self.session = requests.Session()
+        self.session.headers['X-API-KEY'] = self.api_key
+        self.session.headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        self._cache = OrderedDict()  # ключ -> (значение, время истечения)
+        self._lock = threading.Lock()
+
+    def cache_get(self, key):
+        """
+        Возвращает значение из кэша арендатора или None, если его нет или оно устарело
+        """
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < _clock():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return value
+
+    def cache_set(self, key, value):
+        """
+        Сохраняет значение в кэш арендатора, если кэш включен
+        """
+        if self.cache_ttl <= 0:
+            return
+        with self._lock:
+            now = _clock()
+            self._cache.pop(key, None)
+            self._cache[key] = (value, now + self.cache_ttl)
+
+            # Удаляем устаревшие записи и наименее давно использованные сверх лимита
+            expired = [k for k, (_, expires_at) in self._cache.items() if expires_at < now]
+            for k in expired:
+                del self._cache[k]
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+
+    def crm_client(self) -> SessionClient:
+        """
+        Создает клиент RetailCRM v5 поверх общего пула соединений арендатора
+        """
+        return SessionClient(self.url, self.api_key, self.session)
+
+
+def _parse_int(tenant_id: str, config: dict, key: str, default: int, minimum: int) -> int:
+    """
+    Приводит числовой параметр арендатора к int и проверяет нижнюю границу
+    """
+    value = config.get(key, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Tenant {tenant_id}: {key} must be an integer, got {value!r}")
+    if value < minimum:
+        raise ValueError(f"Tenant {tenant_id}: {key} must be >= {minimum}, got {value}")
+    return value
+
+
+def validate_tenant_config(tenant_id: str, config) -> dict:
+    """
+    Проверяет конфигурацию арендатора и приводит параметры к нужным типам,
+    чтобы ошибки конфигурации останавливали запуск, а не первый вебхук
+
+    Raises:
+        ValueError: Если конфигурация некорректна
+    """
+    if not isinstance(config, dict):
+        raise ValueError(f"Tenant {tenant_id}: config must be an object, got {type(config).__name__}")
+
+    missing = [key for key in ('webhook_secret', 'retailcrm_url', 'retailcrm_api_key') if not config.get(key)]
+    if missing:
+        raise ValueError(f"Tenant {tenant_id} is missing config keys: {', '.join(missing)}")
+
+    site = config.get('site', DEFAULT_SITE)
+    if not isinstance(site, str) or not site:
+        raise ValueError(f"Tenant {tenant_id}: site must be a non-empty string, got {site!r}")
+
+    field_mapping = config.get('field_mapping', {})
+    if not isinstance(field_mapping, dict) or not all(
+            isinstance(k, str) and isinstance(v, str) for k, v in field_mapping.items()):
+        raise ValueError(f"Tenant {tenant_id}: field_mapping must map strings to strings")
+
+    return {
+        **config,
+        'site': site,
+        'field_mapping': field_mapping,
+        'rate_limit': _parse_int(tenant_id, config, 'rate_limit', TENANT_RATE_LIMIT, 1),
+        'cache_ttl': _parse_int(tenant_id, config, 'cache_ttl', TENANT_CACHE_TTL, 0),
+        'cache_max_entries': _parse_int(tenant_id, config, 'cache_max_entries', TENANT_CACHE_MAX_ENTRIES, 1),
+    }
+
+
+def load_tenants_config() -> dict:
+    """
+    Загружает конфигурацию арендаторов
+
+    Арендаторы читаются из JSON-файла TENANTS_CONFIG_FILE вида
+    {"<tenant>": {"webhook_secret": ..., "retailcrm_url": ..., "retailcrm_api_key": ...,
+    "site": ..., "field_mapping": {...}, "rate_limit": ..., "cache_ttl": ...}}.
+    Если заданы TAPLINK_WEBHOOK_SECRET, RETAILCRM_URL и RETAILCRM_API_KEY,
+    они описывают арендатора по умолчанию для маршрута /webhook/taplink.
+    """
+    tenants = {}
+
+    # Если задана хотя бы одна переменная, арендатор по умолчанию создается,
+    # а отсутствующие значения приводят к ошибке при проверке ниже
+    if os.getenv('TAPLINK_WEBHOOK_SECRET') or os.getenv('RETAILCRM_URL') or os.getenv('RETAILCRM_API_KEY'):
+        tenants[DEFAULT_TENANT] = {
+            'webhook_secret': os.getenv('TAPLINK_WEBHOOK_SECRET'),
+            'retailcrm_url': os.getenv('RETAILCRM_URL'),
+            'retailcrm_api_key': os.getenv('RETAILCRM_API_KEY'),
+            'site': os.getenv('RETAILCRM_SITE', DEFAULT_SITE),
+        }
+
+    if TENANTS_CONFIG_FILE:
+        with open(TENANTS_CONFIG_FILE, encoding='utf-8') as f:
+            tenants.update(json.load(f))
+
+    for tenant_id, config in tenants.items():
+        tenants[tenant_id] = validate_tenant_config(tenant_id, config)
+
+    logger.info(f"Loaded {len(tenants)} tenants: {', '.join(tenants)}")
+    return tenants
+
+
+class TenantRegistry:
+    """
+    Лениво создает контексты арендаторов и выгружает простаивающие,
+    чтобы один процесс обслуживал всех арендаторов с ограниченной памятью
+    """
+
+    def __init__(self, configs: dict, idle_ttl: int = TENANT_IDLE_TTL, max_clients: int = TENANT_MAX_CLIENTS):
+        self._configs = configs
+        self._idle_ttl = idle_ttl
+        self._max_clients = max_clients
+        self._contexts = OrderedDict()  # tenant_id -> (TenantContext, время последнего обращения)
+        # Окна ограничения частоты хранятся отдельно от контекстов, чтобы переживать выгрузку
+        self._rate_windows = {}  # tenant_id -> [начало окна, число запросов]
+        self._lock = threading.Lock()
+
+    def allow_request(self, tenant_id: str) -> bool:
+        """
+        Проверяет, не превышен ли лимит запросов арендатора в текущую минуту
+        """
+        rate_limit = self._configs[tenant_id].get('rate_limit', TENANT_RATE_LIMIT)
+        with self._lock:
+            now = _clock()
+            window = self._rate_windows.setdefault(tenant_id, [now, 0])
+            if now - window[0] >= 60:
+                window[0] = now
+                window[1] = 0
+            if window[1] >= rate_limit:
+                return False
+            window[1] += 1
+            return True
+
+    def secret(self, tenant_id: str):
+        """
+        Возвращает секрет вебхука арендатора без создания его контекста
+
+        Returns:
+            str: Секрет или None, если арендатор неизвестен
+        """
+        config = self._configs.get(tenant_id)
+        return config['webhook_secret'] if config else None
+
+    def get(self, tenant_id: str):
+        """
+        Возвращает контекст арендатора, создавая его при первом обращении
+
+        Returns:
+            TenantContext: Контекст арендатора или None, если арендатор неизвестен
+        """
+        config = self._configs.get(tenant_id)
+        if config is None:
+            return None
+
+        with self._lock:
+            now = _clock()
+            evicted = self._pop_idle(now)
+
+            entry = self._contexts.pop(tenant_id, None)
+            if entry is None:
+                logger.info(f"Initializing tenant {tenant_id}")
+                context = TenantContext(tenant_id, config)
+            else:
+                context = entry[0]
+            self._contexts[tenant_id] = (context, now)
+
+            # Выгружаем наименее давно использованных арендаторов сверх лимита
+            while len(self._contexts) > self._max_clients:
+                oldest_id, _ = self._contexts.popitem(last=False)
+                evicted.append(oldest_id)
+
+        # Контексты не закрываются явно: запросы, которые еще их используют,
+        # завершатся штатно, а память освободит сборщик мусора
+        for evicted_id in evicted:
+            logger.info(f"Evicting tenant {evicted_id}")
+
+        return context
+
+    def _pop_idle(self, now: float) -> list:
+        """
+        Удаляет из реестра контексты, простаивающие дольше idle_ttl
+        """
+        idle = [tenant_id for tenant_id, (_, last_used) in self._contexts.items()
+                if now - last_used > self._idle_ttl]
+        for tenant_id in idle:
+            del self._contexts[tenant_id]
+        return idle
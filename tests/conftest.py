@@ -0,0 +1,79 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tenants
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """
+    Подменяет requests.Session: отвечает по первому совпавшему фрагменту URL
+    и запоминает все запросы
+    """
+
+    def __init__(self, routes=None):
+        self.routes = routes or {}
+        self.calls = []
+
+    def _respond(self, url):
+        for fragment, payload in self.routes.items():
+            if fragment in url:
+                return FakeResponse(payload)
+        return FakeResponse({'success': True})
+
+    def get(self, url):
+        self.calls.append(('get', url, None))
+        return self._respond(url)
+
+    def post(self, url, data=None):
+        self.calls.append(('post', url, data))
+        return self._respond(url)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(tenants, '_clock', fake)
+    return fake
+
+
+@pytest.fixture
+def make_config():
+    def factory(**overrides):
+        config = {
+            'webhook_secret': 'secret',
+            'retailcrm_url': 'https://example.retailcrm.ru',
+            'retailcrm_api_key': 'key',
+        }
+        config.update(overrides)
+        return config
+    return factory
+
+
+@pytest.fixture
+def make_tenant(make_config):
+    def factory(routes=None, **overrides):
+        tenant = tenants.TenantContext('shop', make_config(**overrides))
+        tenant.session = FakeSession(routes)
+        return tenant
+    return factory
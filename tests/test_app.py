@@ -0,0 +1,53 @@
+import hashlib
+import hmac
+
+import pytest
+
+import app as app_module
+import tenants
+
+
+@pytest.fixture
+def client(monkeypatch, make_config):
+    registry = tenants.TenantRegistry({'shop': make_config()})
+    monkeypatch.setattr(app_module, 'tenant_registry', registry)
+    client = app_module.app.test_client()
+    client.registry = registry
+    return client
+
+
+def sign(body, secret='secret'):
+    return hmac.new(secret.encode('utf-8'), body, hashlib.sha1).hexdigest()
+
+
+def test_unknown_tenant_looks_like_bad_signature(client):
+    body = b'{"action": "leads.created"}'
+
+    unknown = client.post('/webhook/taplink/missing', data=body, headers={'taplink-signature': sign(body)})
+    bad = client.post('/webhook/taplink/shop', data=body, headers={'taplink-signature': 'bad'})
+
+    assert unknown.status_code == bad.status_code == 401
+    assert unknown.get_json() == bad.get_json() == {'error': 'Invalid signature'}
+
+
+def test_bad_signature_does_not_create_tenant_context(client):
+    client.post('/webhook/taplink/shop', data=b'{}', headers={'taplink-signature': 'bad'})
+
+    assert not client.registry._contexts
+
+
+def test_non_ascii_signature_is_rejected(client):
+    response = client.post('/webhook/taplink/shop', data=b'{}',
+                           headers={'taplink-signature': 'подпись'.encode('utf-8').decode('latin-1')})
+
+    assert response.status_code == 401
+
+
+def test_valid_signature_reaches_action_dispatch(client):
+    body = b'{"action": "unknown"}'
+
+    response = client.post('/webhook/taplink/shop', data=body,
+                           headers={'taplink-signature': sign(body), 'Content-Type': 'application/json'})
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Unsupported action: unknown'
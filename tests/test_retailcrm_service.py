@@ -0,0 +1,76 @@
+import retailcrm_service
+
+
+OFFER = {'id': 7, 'prices': [{'price': 100}]}
+CUSTOMER = {'id': 42, 'firstName': 'Иван', 'lastName': '', 'phones': [{'number': '+79990000000'}], 'address': {}}
+
+
+def test_process_order_data_uses_tenant_field_mapping(make_tenant):
+    tenant = make_tenant(field_mapping={'Ваше имя': 'firstName'})
+    order = {'records': [
+        {'title': 'Ваше имя', 'value': 'Иван'},
+        {'title': 'Телефон', 'value': '+79990000000'},
+    ]}
+
+    customer = retailcrm_service.process_order_data(tenant, order)['customer']
+
+    assert customer['firstName'] == 'Иван'
+    assert customer['phone'] == '+79990000000'
+
+
+def test_prepare_order_data_uses_tenant_site(make_tenant):
+    tenant = make_tenant(site='shop')
+
+    order = retailcrm_service.prepare_order_data(tenant, CUSTOMER, [], 0, '', '', '')
+
+    assert order['customer']['site'] == 'shop'
+    assert order['contact']['site'] == 'shop'
+
+
+def test_get_offer_uses_tenant_url_and_session(make_tenant):
+    tenant = make_tenant(routes={'/store/offers': {'success': True, 'offers': [OFFER]}})
+
+    offer = retailcrm_service.get_offer(tenant, {'title': 'Букет'})
+
+    assert offer == OFFER
+    assert tenant.session.calls == [
+        ('get', 'https://example.retailcrm.ru/api/v5/store/offers?filter[name]=Букет', None),
+    ]
+
+
+def test_get_offer_is_not_cached_by_default(make_tenant):
+    tenant = make_tenant(routes={'/store/offers': {'success': True, 'offers': [OFFER]}})
+
+    retailcrm_service.get_offer(tenant, {'title': 'Букет'})
+    retailcrm_service.get_offer(tenant, {'title': 'Букет'})
+
+    assert len(tenant.session.calls) == 2
+
+
+def test_get_offer_is_cached_when_ttl_is_set(make_tenant, clock):
+    tenant = make_tenant(routes={'/store/offers': {'success': True, 'offers': [OFFER]}}, cache_ttl=60)
+
+    retailcrm_service.get_offer(tenant, {'title': 'Букет', 'nominal': '500'})
+    offer = retailcrm_service.get_offer(tenant, {'title': 'Букет', 'nominal': '500'})
+
+    assert offer == OFFER
+    assert len(tenant.session.calls) == 1
+
+
+def test_create_order_in_crm_creates_order_on_tenant_site(make_tenant):
+    tenant = make_tenant(site='shop', routes={
+        '/customers?': {'success': True, 'customers': [CUSTOMER]},
+        '/store/offers': {'success': True, 'offers': [OFFER]},
+        '/orders/create': {'success': True, 'id': 1},
+    })
+    order = {
+        'records': [{'title': 'Имя', 'value': 'Иван'}, {'title': 'Телефон', 'value': '+79990000000'}],
+        'offers': [{'title': 'Букет', 'amount': 1}],
+    }
+
+    result = retailcrm_service.create_order_in_crm(tenant, order)
+
+    assert result['success'] is True
+    method, url, data = tenant.session.calls[-1]
+    assert (method, url) == ('post', 'https://example.retailcrm.ru/api/v5/orders/create')
+    assert data['site'] == 'shop'
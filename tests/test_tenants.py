@@ -0,0 +1,170 @@
+import json
+
+import pytest
+
+import tenants
+
+
+def test_registry_evicts_least_recently_used_over_max_clients(clock, make_config):
+    registry = tenants.TenantRegistry({t: make_config() for t in ('a', 'b', 'c')}, max_clients=2)
+
+    first = registry.get('a')
+    registry.get('b')
+    assert registry.get('a') is first
+    registry.get('c')
+
+    assert list(registry._contexts) == ['a', 'c']
+
+
+def test_registry_evicts_idle_tenants(clock, make_config):
+    registry = tenants.TenantRegistry({t: make_config() for t in ('a', 'b')}, idle_ttl=60)
+
+    first = registry.get('a')
+    clock.now += 61
+    registry.get('b')
+
+    assert list(registry._contexts) == ['b']
+    assert registry.get('a') is not first
+
+
+def test_registry_returns_none_for_unknown_tenant(make_config):
+    registry = tenants.TenantRegistry({'a': make_config()})
+
+    assert registry.get('missing') is None
+
+
+def test_allow_request_blocks_at_limit_until_next_window(clock, make_config):
+    registry = tenants.TenantRegistry({'a': make_config(rate_limit=2)})
+
+    assert registry.allow_request('a')
+    assert registry.allow_request('a')
+    assert not registry.allow_request('a')
+
+    clock.now += 60
+    assert registry.allow_request('a')
+
+
+def test_rate_limit_survives_eviction(clock, make_config):
+    registry = tenants.TenantRegistry({t: make_config(rate_limit=1) for t in ('a', 'b')}, max_clients=1)
+
+    registry.get('a')
+    assert registry.allow_request('a')
+    registry.get('b')
+    registry.get('a')
+
+    assert not registry.allow_request('a')
+
+
+def test_cache_entries_expire(clock, make_config):
+    context = tenants.TenantContext('a', make_config(cache_ttl=10))
+
+    context.cache_set('key', 'value')
+    assert context.cache_get('key') == 'value'
+
+    clock.now += 11
+    assert context.cache_get('key') is None
+
+
+def test_cache_is_bounded(clock, make_config):
+    context = tenants.TenantContext('a', make_config(cache_ttl=10, cache_max_entries=2))
+
+    context.cache_set('one', 1)
+    context.cache_set('two', 2)
+    context.cache_set('three', 3)
+
+    assert context.cache_get('one') is None
+    assert context.cache_get('three') == 3
+
+
+def test_cache_is_disabled_by_default(clock, make_config):
+    context = tenants.TenantContext('a', make_config())
+
+    context.cache_set('key', 'value')
+
+    assert context.cache_get('key') is None
+
+
+def test_crm_client_uses_tenant_session(make_tenant):
+    tenant = make_tenant()
+
+    tenant.crm_client().customers(filters={'phone': '123'})
+    tenant.crm_client().order_create({'number': '1'}, site='shop')
+
+    assert [method for method, _, _ in tenant.session.calls] == ['get', 'post']
+    assert tenant.session.calls[1][1] == 'https://example.retailcrm.ru/api/v5/orders/create'
+
+
+def test_crm_client_is_created_per_call(make_tenant):
+    tenant = make_tenant()
+
+    first, second = tenant.crm_client(), tenant.crm_client()
+
+    assert first is not second
+    assert first.session is second.session is tenant.session
+
+
+@pytest.fixture
+def tenants_file(monkeypatch, tmp_path):
+    def write(data):
+        config_file = tmp_path / 'tenants.json'
+        config_file.write_text(json.dumps(data), encoding='utf-8')
+        monkeypatch.setattr(tenants, 'TENANTS_CONFIG_FILE', str(config_file))
+    for name in ('TAPLINK_WEBHOOK_SECRET', 'RETAILCRM_URL', 'RETAILCRM_API_KEY'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(tenants, 'TENANTS_CONFIG_FILE', None)
+    return write
+
+
+def test_load_tenants_config_rejects_missing_keys(tenants_file):
+    tenants_file({'shop': {'webhook_secret': 'secret'}})
+
+    with pytest.raises(ValueError, match='retailcrm_url, retailcrm_api_key'):
+        tenants.load_tenants_config()
+
+
+def test_load_tenants_config_rejects_partial_default_tenant(tenants_file, monkeypatch):
+    monkeypatch.setenv('TAPLINK_WEBHOOK_SECRET', 'secret')
+    monkeypatch.setenv('RETAILCRM_URL', 'https://example.retailcrm.ru')
+
+    with pytest.raises(ValueError, match='Tenant default is missing config keys: retailcrm_api_key'):
+        tenants.load_tenants_config()
+
+
+@pytest.mark.parametrize('override, message', [
+    ({'rate_limit': 'abc'}, 'rate_limit must be an integer'),
+    ({'rate_limit': 0}, 'rate_limit must be >= 1'),
+    ({'cache_ttl': -1}, 'cache_ttl must be >= 0'),
+    ({'cache_max_entries': None}, 'cache_max_entries must be an integer'),
+    ({'field_mapping': ['Имя']}, 'field_mapping must map strings to strings'),
+    ({'site': ''}, 'site must be a non-empty string'),
+])
+def test_load_tenants_config_rejects_bad_values(tenants_file, make_config, override, message):
+    tenants_file({'shop': make_config(**override)})
+
+    with pytest.raises(ValueError, match=message):
+        tenants.load_tenants_config()
+
+
+def test_load_tenants_config_rejects_non_object_tenant(tenants_file):
+    tenants_file({'shop': 'secret'})
+
+    with pytest.raises(ValueError, match='config must be an object'):
+        tenants.load_tenants_config()
+
+
+def test_load_tenants_config_normalizes_values(tenants_file, make_config):
+    tenants_file({'shop': make_config(rate_limit='5')})
+
+    config = tenants.load_tenants_config()['shop']
+
+    assert config['rate_limit'] == 5
+    assert config['cache_ttl'] == tenants.TENANT_CACHE_TTL
+    assert config['site'] == tenants.DEFAULT_SITE
+
+
+def test_registry_secret_does_not_create_context(make_config):
+    registry = tenants.TenantRegistry({'shop': make_config(webhook_secret='s3')})
+
+    assert registry.secret('shop') == 's3'
+    assert registry.secret('missing') is None
+    assert not registry._contexts